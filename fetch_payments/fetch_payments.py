@@ -7,31 +7,53 @@ Ein benutzerfreundliches CLI-Tool zum Abrufen und Anzeigen neuer Stripe-Checkout
 Features:
 - CLI mit argparse (konfigurierbar: JSON-Pfad, Anzeigeoptionen, Polling-Intervall)
 - Umgebungskonfigurierter Stripe-API-Key
-- JSON-Persistenz aller Zahlungen
+- Append-only JSONL-Persistenz aller Zahlungen; spätere Zeilen mit derselben ID aktualisieren
+  frühere (alte payments.json wird einmalig konvertiert)
+- Inkrementelles Polling über die Stripe Events API statt erneuter Session-Listen
+- Cursor-Datei (<json>.cursor) mit der letzten Event-ID für schnellen Start ohne Einlesen der Historie
+- Absturzsichere Schreibvorgänge (atomares Umbenennen, fsync nur mit --durable)
 - Übersichtliche Konsolen-Ausgabe mit Rich Tables
-- Automatisches Polling in einstellbaren Intervallen
+- Automatisches, asynchrones Polling mit adaptivem Intervall (Backoff bei Leerlauf und Rate-Limits)
 - Logging mit anpassbarem Detailgrad
 
 Installation:
-    pip install stripe rich
+    pip install 'stripe>=10' httpx rich orjson
 
 Beispielaufruf:
     export STRIPE_API_KEY=sk_test_xxx
-    python fetch_stripe_payments.py --json payments.json --show-table --verbose --interval 15
+    python fetch_stripe_payments.py --json payments.jsonl --show-table --verbose --interval 15
 """
 import os
 import json
+import asyncio
 import sys
 import time
 import logging
 import argparse
-from typing import List, Dict
+from functools import lru_cache
+from itertools import chain
+from operator import itemgetter, methodcaller
+from typing import List, Dict, Optional, Tuple
 
 import stripe
 from rich.console import Console
 from rich.table import Table
 from rich.logging import RichHandler
 
+# Schnelle JSON-(De-)Serialisierung: pip install orjson (Fallback: Standardbibliothek)
+try:
+    import orjson
+
+    def dumps_line(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+
+    loads = orjson.loads
+except ImportError:
+    def dumps_line(obj) -> bytes:
+        return (json.dumps(obj, separators=(',', ':')) + '\n').encode()
+
+    loads = json.loads
+
 # Setup Rich console for styled output
 console = Console()
 
@@ -44,73 +66,322 @@ logging.basicConfig(
 )
 logger = logging.getLogger("fetch_stripe_payments")
 
+# Stripe-Events, die eine (erfolgreich) abgeschlossene Checkout Session melden
+EVENT_TYPES = ['checkout.session.completed', 'checkout.session.async_payment_succeeded']
+
+# Anzahl paralleler Zeitfenster beim Nachladen der Sessions (erster Start)
+BACKFILL_WINDOWS = 8
+
+# Frühester sinnvoller Startpunkt für das Nachladen ohne gespeicherte Zahlungen
+# (2019-01-01, Checkout Sessions gibt es erst seit 2019)
+CHECKOUT_SESSIONS_EPOCH = 1546300800
+
+# Timeout (Sekunden) für Anfragen an die Stripe API
+HTTP_TIMEOUT = 30
+
+# C-implementierte Zugriffe statt Lambdas/Generatoren pro Element; ``created`` und
+# ``customer_email`` dürfen in gespeicherten Zeilen fehlen (ältere/handbearbeitete Datensätze)
+BY_CREATED = methodcaller('get', 'created', 0)
+TABLE_FIELDS = itemgetter('id', 'amount_total', 'currency', 'payment_status', 'created')
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Spätestens ab so vielen gesammelten Zahlungen wird die Tabelle sofort ausgegeben
+TABLE_MAX_PENDING = 50
+
+# Großer Schreibpuffer, damit komplett neu geschriebene Dateien mit einem einzigen write() auf die Platte gehen
+WRITE_BUFFER_SIZE = 1 << 20
+
 
 def load_existing_payments(path: str) -> List[Dict]:
-    """Lade bestehende Zahlungen aus einer JSON-Datei."""
-    if os.path.isfile(path):
+    """Lade bestehende Zahlungen aus einer JSONL-Datei (ein JSON-Objekt pro Zeile).
+
+    Die Datei ist ein Änderungsprotokoll: Eine spätere Zeile mit derselben ``id``
+    (z.B. ``paid`` nach ``unpaid``) ersetzt die frühere, die Position bleibt erhalten.
+    Eine abgeschnittene letzte Zeile (z.B. nach einem Absturz mitten im Schreiben)
+    wird ignoriert; abgeschnitten wird sie von ``repair_log_tail``. Enthält ``path``
+    noch das alte Format (eine JSON-Liste) oder existiert nur eine alte ``.json``-Datei
+    daneben, wird einmalig nach JSONL konvertiert.
+    """
+    if not os.path.isfile(path):
+        legacy_path = os.path.splitext(path)[0] + '.json'
+        if legacy_path != path and os.path.isfile(legacy_path):
+            return convert_legacy_json(legacy_path, path)
+        return []
+    if is_legacy_json(path):
+        return convert_legacy_json(path, path)
+
+    records = {}
+    with open(path, 'rb') as f:
+        lines = f.read().split(b'\n')
+    lines.pop()  # leer oder unvollständig
+    for lineno, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
         try:
-            with open(path, 'r') as f:
-                data = json.load(f)
-                logger.info(f"[green]Loaded[/green] {len(data)} existing payments from [bold]{path}[/bold]")
-                return data
-        except Exception as e:
-            logger.warning(f"[yellow]Warning:[/yellow] Could not parse JSON file: {e} — starting fresh.")
-    return []
+            record = loads(line)
+        except ValueError as e:
+            logger.warning(f"[yellow]Warning:[/yellow] Skipping unreadable line {lineno} in {path}: {e}")
+            continue
+        # Zeilen ohne id bleiben einzeln erhalten (Zeilennummer als Schlüssel)
+        records[record.get('id', lineno)] = record
+    payments = list(records.values())
+    logger.info(f"[green]Loaded[/green] {len(payments)} existing payments from [bold]{path}[/bold]")
+    return payments
+
+
+def repair_log_tail(path: str) -> None:
+    """Schneide eine unvollständige letzte Zeile der JSONL-Datei ab.
 
+    Liest nur das Dateiende, damit der nächste Append nicht an den Rest eines
+    abgebrochenen Schreibvorgangs angeklebt wird. Alte JSON-Listen bleiben unberührt.
+    """
+    if not os.path.isfile(path) or is_legacy_json(path):
+        return
+    with open(path, 'rb+') as f:
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        cut = 0
+        while pos > 0:
+            start = max(0, pos - 4096)
+            f.seek(start)
+            nl = f.read(pos - start).rfind(b'\n')
+            if nl >= 0:
+                cut = start + nl + 1
+                break
+            pos = start
+        if cut != end:
+            logger.warning(f"[yellow]Warning:[/yellow] Dropping truncated last line in {path}")
+            f.truncate(cut)
 
-def save_payments(path: str, payments: List[Dict]) -> None:
-    """Speichere alle Zahlungen in einer JSON-Datei."""
+
+def is_legacy_json(path: str) -> bool:
+    """Prüfe am ersten Nicht-Leerzeichen, ob ``path`` noch eine alte JSON-Liste statt JSONL enthält."""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(4096)
+            if not chunk:
+                return False
+            chunk = chunk.lstrip()
+            if chunk:
+                return chunk[:1] == b'['
+
+
+def convert_legacy_json(legacy_path: str, path: str) -> List[Dict]:
+    """Konvertiere eine alte JSON-Liste aus ``legacy_path`` einmalig nach JSONL in ``path``.
+
+    Lässt sich die Datei nicht lesen, wird das Programm beendet, statt sie zu überschreiben.
+    """
     try:
-        with open(path, 'w') as f:
-            json.dump(payments, f, indent=2)
-        logger.info(f"[green]Saved[/green] {len(payments)} payments to [bold]{path}[/bold]")
+        with open(legacy_path, 'rb') as f:
+            data = loads(f.read())
     except Exception as e:
-        logger.error(f"[red]Error saving JSON:[/red] {e}")
+        logger.error(f"[red]Error:[/red] Could not parse legacy JSON file {legacy_path}: {e} — refusing to start.")
         sys.exit(1)
+    data.sort(key=BY_CREATED)
+    write_atomic(path, serialize_payments(data))
+    logger.info(f"[green]Converted[/green] {len(data)} payments from [bold]{legacy_path}[/bold] to JSONL in [bold]{path}[/bold]")
+    return data
+
+
+def write_atomic(path: str, data: bytes, durable: bool = False) -> None:
+    """Schreibe ``data`` in eine temporäre Datei und benenne sie per ``os.replace`` um.
+
+    Ein Abbruch hinterlässt so nie eine halb geschriebene Datei. Nur mit ``durable``
+    wird vor dem Umbenennen ein ``fsync`` ausgeführt.
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb', buffering=WRITE_BUFFER_SIZE) as f:
+        f.write(data)
+        if durable:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def serialize_payments(payments: List[Dict]) -> bytes:
+    """Serialisiere Zahlungen kompakt als JSONL in einen einzigen Byte-Puffer."""
+    return b''.join(map(dumps_line, payments))
+
+
+def open_payments_log(path: str):
+    """Öffne die JSONL-Datei ungepuffert zum Anhängen; das Handle bleibt für die gesamte Laufzeit offen."""
+    return open(path, 'ab', buffering=0)
+
+
+def append_payments(log, new_payments: List[Dict], durable: bool = False) -> None:
+    """Hänge neue Zahlungen als JSON-Zeilen an die offene JSONL-Datei an (ein einziger write()).
+
+    Schreibfehler werden als ``OSError`` weitergereicht; das Beenden übernimmt ``main()``.
+    """
+    buf = serialize_payments(new_payments)
+    nwritten = log.write(buf)
+    if nwritten != len(buf):
+        raise IOError(f"short write: {nwritten}/{len(buf)} bytes")
+    if durable:
+        os.fsync(log.fileno())
+    logger.info(f"[green]Saved[/green] {len(new_payments)} new payments to [bold]{log.name}[/bold]")
+
+
+def load_cursor(path: str) -> Optional[str]:
+    """Lese die ID des zuletzt verarbeiteten Stripe-Events aus ``<path>.cursor`` (None, falls nicht vorhanden)."""
+    try:
+        with open(path + '.cursor', 'r') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def save_cursor(path: str, event_id: str, durable: bool = False) -> None:
+    """Speichere die ID des zuletzt verarbeiteten Stripe-Events in ``<path>.cursor``."""
+    write_atomic(path + '.cursor', f"{event_id}\n".encode(), durable)
+
+
+def store_new_payments(log, path: str, new_payments: List[Dict], event_id: Optional[str],
+                       durable: bool = False) -> None:
+    """Hänge neue Zahlungen an und schreibe danach den Event-Cursor fort."""
+    append_payments(log, new_payments, durable)
+    if event_id:
+        save_cursor(path, event_id, durable)
 
 
 def get_last_timestamp(payments: List[Dict]) -> int:
     """Gebe den neuesten Zeitstempel (UNIX) aller bisherigen Zahlungen zurück."""
-    if not payments:
+    return max(map(BY_CREATED, payments), default=0)
+
+
+def session_to_record(session) -> Dict:
+    """Wandle eine Stripe Checkout Session in einen kompakten Zahlungs-Datensatz um."""
+    cust = session.customer_details or {}
+    record = {
+        'id': session.id,
+        'created': session.created,
+        'customer_email': cust.get('email'),
+        'customer_name': cust.get('name'),
+        'customer_phone': cust.get('phone'),
+        'amount_total': session.amount_total / 100.0,
+        'currency': session.currency,
+        'payment_method_types': session.payment_method_types,
+        'payment_status': session.payment_status,
+        'locale': session.locale,
+        'metadata': session.metadata or {}
+    }
+    logger.info(
+        f"[cyan]New Session:[/cyan] {record['id']} | {record['customer_email']} | "
+        f"{record['amount_total']:.2f} {record['currency'].upper()}"
+    )
+    return record
+
+
+async def fetch_new_sessions(since: int, until: int) -> List[Dict]:
+    """Hole alle abgeschlossenen Checkout Sessions mit ``since < created <= until`` (nur für das Nachladen).
+
+    Wie beim Event-Feed zählen nur abgeschlossene Sessions als Zahlung.
+    """
+    logger.debug(f"Fetching sessions created between UNIX timestamps {since} and {until}...")
+    sessions = await stripe.checkout.Session.list_async(
+        limit=100,
+        created={'gt': since, 'lte': until},
+        status='complete'
+    )
+    new_records = []
+    async for session in sessions.auto_paging_iter():
+        new_records.append(session_to_record(session))
+    # Stripe liefert neueste zuerst; einmal umdrehen (O(k)) statt die Historie zu sortieren
+    new_records.reverse()
+    return new_records
+
+
+async def fetch_account_created() -> int:
+    """Gebe den Erstellungszeitpunkt des Stripe-Kontos zurück (0, falls nicht abrufbar)."""
+    try:
+        account = await stripe.Account.retrieve_async()
+    except stripe.StripeError as e:
+        # z.B. eingeschränkter API-Key ohne Leserecht auf das Konto
+        logger.debug(f"Could not retrieve account creation time: {e}")
         return 0
-    return max(p.get('created', 0) for p in payments)
+    return account.get('created') or 0
+
+
+async def backfill_concurrent(since: int, now: int, k: int = BACKFILL_WINDOWS) -> List[Dict]:
+    """Lade Sessions seit ``since`` nach, aufgeteilt in ``k`` Zeitfenster, die parallel abgerufen werden.
+
+    Die Fenster sind aufsteigend und jedes Ergebnis ist chronologisch, daher ist die
+    aneinandergehängte Liste bereits sortiert. Schlägt ein Fenster fehl, wird der Fehler
+    weitergereicht, damit kein unvollständiges Ergebnis als vollständig gilt. Ohne
+    gespeicherte Zahlungen (``since == 0``) beginnen die Fenster bei der Erstellung des
+    Stripe-Kontos, frühestens bei ``CHECKOUT_SESSIONS_EPOCH``, statt im Jahr 1970.
+    """
+    if not since:
+        since = min(max(CHECKOUT_SESSIONS_EPOCH, await fetch_account_created() - 1), now)
+    k = max(1, min(k, now - since))
+    edges = [since + (now - since) * i // k for i in range(k)] + [now]
+    windows = await asyncio.gather(*[fetch_new_sessions(lo, hi) for lo, hi in zip(edges, edges[1:])])
+    return list(chain.from_iterable(windows))
+
 
+async def fetch_latest_event_id() -> Optional[str]:
+    """Gebe die ID des neuesten relevanten Stripe-Events zurück (Startpunkt für das Polling)."""
+    events = await stripe.Event.list_async(limit=1, types=EVENT_TYPES)
+    return events.data[0].id if events.data else None
 
-def fetch_new_sessions(since: int) -> List[Dict]:
-    """Hole alle neuen Stripe Checkout Sessions seit einem gegebenen Zeitstempel."""
-    logger.debug(f"Fetching sessions created after UNIX timestamp {since}...")
+
+async def fetch_new_events(after: Optional[str], since: int) -> Tuple[List[Dict], Optional[str]]:
+    """Hole alle neuen Checkout-Events nach dem Event ``after`` (bzw. nach ``since``, falls noch kein Event bekannt ist).
+
+    Gibt die Zahlungs-Datensätze in chronologischer Reihenfolge und die ID des neuesten Events zurück.
+    Meldet Stripe dieselbe Session mehrfach (z.B. ``completed`` und ``async_payment_succeeded``),
+    gewinnt innerhalb eines Abrufs der neueste Stand; kommen die Events in verschiedenen
+    Zyklen, wird die Session erneut angehängt und die spätere Zeile aktualisiert die frühere
+    (siehe ``load_existing_payments``). Ist das Cursor-Event bei Stripe nicht mehr vorhanden
+    (Events werden nur 30 Tage aufbewahrt), wird ``stripe.InvalidRequestError`` weitergereicht.
+    """
+    logger.debug(f"Fetching events after {after or f'UNIX timestamp {since}'}...")
+    params = {'ending_before': after} if after else {'created': {'gt': since}}
     try:
-        sessions = stripe.checkout.Session.list(
-            limit=100,
-            created={'gt': since},
-            expand=['data.customer_details']
-        )
+        events = await stripe.Event.list_async(limit=100, types=EVENT_TYPES, **params)
+        # Mit ending_before liefert der Iterator bereits chronologisch, sonst neueste zuerst;
+        # Fehler beim Nachladen weiterer Seiten werden wie Fehler der ersten Seite behandelt
+        collected = [event async for event in events.auto_paging_iter()]
+    except stripe.RateLimitError:
+        raise
+    except stripe.InvalidRequestError as e:
+        if after and e.code == 'resource_missing':
+            raise
+        logger.error(f"[red]Stripe API Error:[/red] {e}")
+        return [], after
     except Exception as e:
         logger.error(f"[red]Stripe API Error:[/red] {e}")
-        return []
+        return [], after
+
+    if not after:
+        collected.reverse()
+    if not collected:
+        return [], after
+
+    records = {}
+    for event in collected:
+        record = session_to_record(event.data.object)
+        records.pop(record['id'], None)
+        records[record['id']] = record
+    return list(records.values()), collected[-1].id
 
-    new_records = []
-    for session in sessions.auto_paging_iter():
-        cust = session.customer_details or {}
-        record = {
-            'id': session.id,
-            'created': session.created,
-            'customer_email': cust.get('email'),
-            'customer_name': cust.get('name'),
-            'customer_phone': cust.get('phone'),
-            'amount_total': session.amount_total / 100.0,
-            'currency': session.currency,
-            'payment_method_types': session.payment_method_types,
-            'payment_status': session.payment_status,
-            'locale': session.locale,
-            'metadata': session.metadata or {}
-        }
-        logger.info(
-            f"[cyan]New Session:[/cyan] {record['id']} | {record['customer_email']} | "
-            f"{record['amount_total']:.2f} {record['currency'].upper()}"
-        )
-        new_records.append(record)
-    return new_records
+
+def get_retry_after(error: Exception, default: int) -> int:
+    """Lese die Wartezeit aus dem ``Retry-After``-Header einer Stripe-Fehlermeldung."""
+    try:
+        return max(int((error.headers or {}).get('Retry-After')), 1)
+    except (TypeError, ValueError):
+        return default
+
+
+@lru_cache(maxsize=1024)
+def format_timestamp(ts: int) -> str:
+    """Formatiere einen UNIX-Zeitstempel in lokaler Zeit (gecacht, viele Zeilen teilen Sekunden)."""
+    return time.strftime(TIME_FORMAT, time.localtime(ts))
+
+
+# Wenige verschiedene Währungen: Großschreibung einmal pro Wert
+upper = lru_cache(maxsize=64)(str.upper)
 
 
 def display_table(payments: List[Dict]) -> None:
@@ -120,14 +391,16 @@ def display_table(payments: List[Dict]) -> None:
     for col in columns:
         table.add_column(col, justify="center")
 
+    add_row = table.add_row
     for p in payments:
-        table.add_row(
-            p['id'],
+        pid, amount, currency, status, created = TABLE_FIELDS(p)
+        add_row(
+            pid,
             p.get('customer_email') or "-",
-            f"{p['amount_total']:.2f}",
-            p['currency'].upper(),
-            p['payment_status'],
-            time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(p['created']))
+            f"{amount:.2f}",
+            upper(currency),
+            status,
+            format_timestamp(created)
         )
     console.print(table)
 
@@ -137,13 +410,17 @@ def parse_args():
         description="Fetch and store Stripe Checkout Session payments."
     )
     parser.add_argument(
-        '--json', '-j', default='payments.json',
-        help='Pfad zur JSON-Datei zum Speichern der Zahlungen'
+        '--json', '-j', default='payments.jsonl',
+        help='Pfad zur JSONL-Datei zum Speichern der Zahlungen (eine Zahlung pro Zeile)'
     )
     parser.add_argument(
         '--show-table', action='store_true',
         help='Zeige nach dem Abruf eine Übersichtstabelle'
     )
+    parser.add_argument(
+        '--table-interval', type=float, default=5,
+        help='Tabelle höchstens alle N Sekunden ausgeben, neue Zahlungen werden bis dahin gesammelt'
+    )
     parser.add_argument(
         '--verbose', '-v', action='store_true',
         help='Mehr Ausgaben (Debug-Level Logging)'
@@ -152,10 +429,20 @@ def parse_args():
         '--interval', '-i', type=int, default=15,
         help='Polling-Intervall in Sekunden (0 = nur einmal)'
     )
+    parser.add_argument(
+        '--durable', action='store_true',
+        help='Jeden Schreibvorgang per fsync auf die Platte zwingen. Ohne diese Option bleiben '
+             'die Dateien nach einem Absturz konsistent, der letzte Zyklus kann aber fehlen.'
+    )
+    parser.add_argument(
+        '--interval-max', type=int, default=None,
+        help='Maximales Polling-Intervall in Sekunden, wenn keine neuen Zahlungen kommen '
+             '(Standard: 16 × --interval)'
+    )
     return parser.parse_args()
 
 
-def main():
+async def main():
     args = parse_args()
 
     # Logging-Level anpassen
@@ -168,27 +455,142 @@ def main():
         console.print("[red]Error:[/red] Environment variable STRIPE_API_KEY is not set.")
         sys.exit(1)
     stripe.api_key = api_key
+    # Ein einziger HTTP-Client für alle Zyklen: hält TCP/TLS-Verbindungen im Pool offen,
+    # statt bei jedem Poll neu zu verbinden. Stripe wiederholt nur Verbindungsfehler und
+    # Antworten, die Stripe selbst als wiederholbar markiert; normale Rate-Limits (429)
+    # behandelt die Polling-Schleife.
+    stripe.default_http_client = stripe.HTTPXClient(timeout=HTTP_TIMEOUT)
+    stripe.max_network_retries = 2
+
+    # Event-Cursor laden; fehlt er, wird in der Polling-Schleife zuerst nachgeladen.
+    last_event_id = load_cursor(args.json)
+    if last_event_id is not None and os.path.isfile(args.json) and is_legacy_json(args.json):
+        # Cursor gehört nicht zu dieser (noch alten) Datei: erst konvertieren und nachladen
+        last_event_id = None
+    since = int(time.time())
+    needs_backfill = last_event_id is None
+    if needs_backfill:
+        last_ts = get_last_timestamp(load_existing_payments(args.json))
+    # Nachgeladene Datensätze, die das erste Event-Polling unverändert noch einmal melden kann
+    backfilled = {}
+
+    # Neue Zahlungen für die Tabelle sammeln und gebündelt ausgeben (siehe --table-interval)
+    pending_display = []
+    last_render = 0.0
+
+    # Polling-Schleife: das Speichern läuft im Thread-Pool und überlappt mit dem
+    # nächsten Abruf, nur zwei Speichervorgänge laufen nie gleichzeitig.
+    loop = asyncio.get_running_loop()
+    pending_save = None
+    interval_max = args.interval_max or max(args.interval, 1) * 16
+    sleep_for = args.interval
+    # Wartezeit nach API-Fehlern ohne Retry-After: mindestens 1s, verdoppelt bei jedem weiteren Fehler
+    retry_min = max(args.interval, 1)
+    retry_delay = retry_min
+    repair_log_tail(args.json)
+    log = open_payments_log(args.json)
+    try:
+        while True:
+            # Fehler beim Speichern im Thread-Pool sofort melden, nicht erst beim nächsten Batch
+            if pending_save is not None and pending_save.done():
+                save, pending_save = pending_save, None
+                save.result()
 
-    # Lade bestehende Zahlungen
-    payments = load_existing_payments(args.json)
-
-    # Polling-Schleife
-    while True:
-        last_ts = get_last_timestamp(payments)
-        new_payments = fetch_new_sessions(last_ts)
-        if new_payments:
-            payments.extend(new_payments)
-            payments.sort(key=lambda x: x['created'])
-            save_payments(args.json, payments)
-            if args.show_table:
-                display_table(new_payments)
-        else:
-            logger.debug("No new payments this cycle.")
-
-        if args.interval <= 0:
-            break
-        logger.debug(f"Warte {args.interval}s bis zum nächsten Durchlauf...")
-        time.sleep(args.interval)
+            if needs_backfill:
+                # Zuerst den aktuellen Event-Stand merken, dann erst den Zeitpunkt bis zu dem
+                # nachgeladen wird: jede später abgeschlossene Session kommt über die Events.
+                # Cursor erst speichern, wenn alle Zeitfenster vollständig geladen wurden;
+                # bei einem Fehler wird das Nachladen im nächsten Durchlauf wiederholt.
+                try:
+                    last_event_id = await fetch_latest_event_id()
+                    since = int(time.time())
+                    backfill = await backfill_concurrent(last_ts, since)
+                except stripe.StripeError as e:
+                    retry_after = get_retry_after(e, default=retry_delay)
+                    retry_delay = min(retry_delay * 2, interval_max)
+                    logger.warning(f"[yellow]Backfill failed:[/yellow] {e} — retrying in {retry_after}s")
+                    await asyncio.sleep(retry_after)
+                    continue
+                if backfill:
+                    if pending_save is not None:
+                        save, pending_save = pending_save, None
+                        await save
+                    append_payments(log, backfill, args.durable)
+                    if args.show_table:
+                        pending_display.extend(backfill)
+                if last_event_id:
+                    save_cursor(args.json, last_event_id, args.durable)
+                backfilled = {r['id']: r for r in backfill}
+                needs_backfill = False
+                logger.debug(f"Starting after event {last_event_id or f'UNIX timestamp {since}'}")
+
+            try:
+                new_payments, last_event_id = await fetch_new_events(last_event_id, since)
+            except stripe.RateLimitError as e:
+                retry_after = get_retry_after(e, default=retry_delay)
+                retry_delay = min(retry_delay * 2, interval_max)
+                logger.warning(f"[yellow]Rate limited by Stripe[/yellow] — retrying in {retry_after}s")
+                await asyncio.sleep(retry_after)
+                continue
+            except stripe.InvalidRequestError as e:
+                if e.code != 'resource_missing':
+                    retry_after, retry_delay = retry_delay, min(retry_delay * 2, interval_max)
+                    logger.error(f"[red]Stripe API Error:[/red] {e} — retrying in {retry_after}s")
+                    await asyncio.sleep(retry_after)
+                    continue
+                # Cursor-Event abgelaufen: wie ohne Cursor ab der neuesten gespeicherten Zahlung nachladen
+                logger.warning(f"[yellow]Cursor event no longer available:[/yellow] {e} — backfilling.")
+                if pending_save is not None:
+                    save, pending_save = pending_save, None
+                    await save
+                last_ts = get_last_timestamp(load_existing_payments(args.json))
+                needs_backfill = True
+                continue
+            retry_delay = retry_min
+            if backfilled:
+                # Nur identische Datensätze verwerfen, geänderte (z.B. jetzt bezahlt) anhängen
+                new_payments = [p for p in new_payments if backfilled.get(p['id']) != p]
+                backfilled = {}
+                if not new_payments and last_event_id:
+                    save_cursor(args.json, last_event_id, args.durable)
+            if new_payments:
+                if pending_save is not None:
+                    save, pending_save = pending_save, None
+                    await save
+                pending_save = loop.run_in_executor(
+                    None, store_new_payments, log, args.json, new_payments, last_event_id, args.durable
+                )
+                if args.show_table:
+                    pending_display.extend(new_payments)
+            else:
+                logger.debug("No new payments this cycle.")
+
+            if pending_display and (len(pending_display) >= TABLE_MAX_PENDING
+                                    or time.monotonic() - last_render >= args.table_interval):
+                display_table(pending_display)
+                pending_display.clear()
+                last_render = time.monotonic()
+
+            if args.interval <= 0:
+                break
+            # Adaptives Intervall: bei Leerlauf verdoppeln (bis interval_max), bei neuen Zahlungen zurücksetzen
+            sleep_for = args.interval if new_payments else min(sleep_for * 2, interval_max)
+            logger.debug(f"Warte {sleep_for}s bis zum nächsten Durchlauf...")
+            await asyncio.sleep(sleep_for)
+    except OSError as e:
+        logger.error(f"[red]Error saving payments:[/red] {e}")
+        sys.exit(1)
+    finally:
+        if pending_display:
+            display_table(pending_display)
+        try:
+            if pending_save is not None:
+                await pending_save
+        except OSError as e:
+            logger.error(f"[red]Error saving payments:[/red] {e}")
+            sys.exit(1)
+        finally:
+            log.close()
 
 if __name__ == '__main__':
-    main()
+    asyncio.run(main())
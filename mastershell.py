@@ -6,18 +6,34 @@ Starte und verwalte mehrere Python-Subprozesse mit interaktiver Ein-/Ausgabe,
 Command-History, Tab-Completion und farbiger Ausgabe.
 """
 
+import os
 import sys
+import time
+import selectors
 import signal
 import threading
 import subprocess
 from pathlib import Path
 
-# Farbe in Konsole: pip install colorama
-try:
-    from colorama import init, Fore, Style
-except ImportError:
-    print("✖ Bitte installiere colorama: pip install colorama")
-    sys.exit(1)
+# Farbe in Konsole: unter Windows über colorama (pip install colorama), sonst
+# direkt per ANSI-Escape-Codes ohne Wrapper um sys.stdout
+if sys.platform == "win32":
+    try:
+        from colorama import init, Fore, Style
+    except ImportError:
+        print("✖ Bitte installiere colorama: pip install colorama")
+        sys.exit(1)
+    init(autoreset=True)
+else:
+    class Fore:
+        RED = "\x1b[31m"
+        GREEN = "\x1b[32m"
+        YELLOW = "\x1b[33m"
+        MAGENTA = "\x1b[35m"
+        CYAN = "\x1b[36m"
+
+    class Style:
+        RESET_ALL = "\x1b[0m"
 
 import readline
 import atexit
@@ -33,6 +49,20 @@ PROGRAMS = {
 HISTORY_FILE = Path.home() / ".mastershell_history"
 PROMPT = Fore.GREEN + "MasterShell> " + Style.RESET_ALL
 
+# Ausgabe-Puffer der Subprozesse
+READ_SIZE = 65536       # Bytes pro read() von der Pipe
+FLUSH_LINES = 64        # spätestens nach so vielen Zeilen ausgeben
+FLUSH_INTERVAL = 0.01   # bzw. spätestens nach so vielen Sekunden
+EXIT_POLL_INTERVAL = 0.1  # Abfrage-Intervall für den Exit-Code nach Ende der Ausgabe
+
+# Startbefehle einmalig beim Laden vorbereiten; fehlende Skripte werden hier gemeldet
+COMMANDS = {}
+for _name, _script in PROGRAMS.items():
+    if _script.is_file():
+        COMMANDS[_name] = (sys.executable, str(_script))
+    else:
+        print(f"{Fore.RED}[Error] Skript nicht gefunden: {_script}{Style.RESET_ALL}")
+
 # === Setup Command-History & Tab-Completion ===
 def setup_readline():
     try:
@@ -51,31 +81,117 @@ def setup_readline():
     readline.set_completer(completer)
     readline.parse_and_bind("tab: complete")
 
-# === Ausgabe-Leser für jede Session ===
-def reader_thread(name, proc):
-    for line in proc.stdout:
-        print(f"{Fore.YELLOW}[{name}]{Style.RESET_ALL} {line.rstrip()}")
-    print(f"{Fore.MAGENTA}[Info] Prozess '{name}' beendet (Exit-Code {proc.returncode}){Style.RESET_ALL}")
+# === Ausgabe-Leser ===
+# Nur vollständige Zeilen dekodieren, der Rest bleibt im Puffer der Session
+def split_lines(session, chunk):
+    buf = session["buf"]
+    buf += chunk
+    end = buf.rfind(b"\n")
+    if end < 0:
+        return []
+    lines = buf[:end].decode("utf-8", "replace").split("\n")
+    del buf[:end + 1]
+    return [f"{session['prefix']}{line.rstrip()}\n" for line in lines]
+
+# EOF: Rest ausgeben und Exit-Code melden
+def eof_lines(session):
+    rest = session["buf"].decode("utf-8", "replace")
+    return [f"{session['prefix']}{rest.rstrip()}\n"] if rest else []
+
+def exit_line(session, code):
+    return f"{Fore.MAGENTA}[Info] Prozess '{session['name']}' beendet (Exit-Code {code}){Style.RESET_ALL}\n"
+
+def write_lines(out):
+    sys.stdout.write("".join(out))
+    sys.stdout.flush()
+
+# Alle Sessions in einem Thread (selectors). Zeilen werden gesammelt und mit einem
+# einzigen write() ausgegeben, sobald FLUSH_LINES erreicht sind oder FLUSH_INTERVAL
+# Sekunden vergangen sind.
+def reader_loop(sel):
+    out = []
+    first_buffered = 0.0
+    # Sessions mit geschlossener Ausgabe, deren Prozess noch nicht beendet ist; der
+    # Exit-Code wird per poll() nachgereicht, damit kein wait() die anderen blockiert
+    exiting = []
+
+    while sel.get_map() or exiting:
+        # Im Leerlauf blockierend warten statt alle FLUSH_INTERVAL Sekunden aufzuwachen
+        if out:
+            timeout = FLUSH_INTERVAL
+        elif exiting:
+            timeout = EXIT_POLL_INTERVAL
+        else:
+            timeout = None
+        events = sel.select(timeout=timeout)
+        for key, _ in events:
+            session = key.data
+            chunk = os.read(key.fd, READ_SIZE)
+            if chunk:
+                out.extend(split_lines(session, chunk))
+                continue
+
+            sel.unregister(key.fileobj)
+            out.extend(eof_lines(session))
+            exiting.append(session)
+
+        for session in list(exiting):
+            code = session["proc"].poll()
+            if code is not None:
+                out.append(exit_line(session, code))
+                exiting.remove(session)
+
+        if out and not first_buffered:
+            first_buffered = time.monotonic()
+        if out and (not events or len(out) >= FLUSH_LINES
+                    or time.monotonic() - first_buffered >= FLUSH_INTERVAL):
+            write_lines(out)
+            out.clear()
+            first_buffered = 0.0
+
+    if out:
+        write_lines(out)
+
+# Windows: select/selectors unterstützen dort nur Sockets, keine Pipes. Deshalb
+# ein Thread pro Session, der blockierend liest und jeden gelesenen Block mit
+# einem write() ausgibt.
+def reader_thread(session):
+    fd = session["proc"].stdout.fileno()
+    while True:
+        chunk = os.read(fd, READ_SIZE)
+        if not chunk:
+            break
+        lines = split_lines(session, chunk)
+        if lines:
+            write_lines(lines)
+    write_lines(eof_lines(session) + [exit_line(session, session["proc"].wait())])
 
 # === Prozesse starten ===
 def spawn_processes():
     procs = {}
-    for name, script in PROGRAMS.items():
-        if not script.exists():
-            print(f"{Fore.RED}[Error] Skript nicht gefunden: {script}{Style.RESET_ALL}")
-            continue
-        cmd = [sys.executable, str(script)]
+    sel = None if sys.platform == "win32" else selectors.DefaultSelector()
+    for name, cmd in COMMANDS.items():
         p = subprocess.Popen(
             cmd,
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1
+            bufsize=0
         )
         procs[name] = p
-        threading.Thread(target=reader_thread, args=(name, p), daemon=True).start()
+        session = {
+            "name": name,
+            "proc": p,
+            "prefix": f"{Fore.YELLOW}[{name}]{Style.RESET_ALL} ",
+            "buf": bytearray(),
+        }
+        if sel is None:
+            threading.Thread(target=reader_thread, args=(session,), daemon=True).start()
+        else:
+            sel.register(p.stdout, selectors.EVENT_READ, data=session)
         print(f"{Fore.CYAN}[Info] Gestartet '{name}': {' '.join(cmd)}{Style.RESET_ALL}")
+    if procs and sel is not None:
+        threading.Thread(target=reader_loop, args=(sel,), daemon=True).start()
     return procs
 
 # === Sanfter Shutdown aller Subprozesse ===
@@ -95,8 +211,6 @@ def shutdown(procs):
 
 # === Hauptprogramm ===
 def main():
-    # Farbausgabe initialisieren
-    init(autoreset=True)
     setup_readline()
 
     procs = spawn_processes()
@@ -135,7 +249,7 @@ def main():
                 continue
 
             try:
-                p.stdin.write(msg + "\n")
+                p.stdin.write((msg + "\n").encode())
                 p.stdin.flush()
             except Exception as e:
                 print(Fore.RED + f"Fehler beim Senden an '{name}': {e}" + Style.RESET_ALL)